@@ -6,9 +6,17 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
+import plotly.graph_objects as go
 from scipy import stats
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import xxhash
+try:
+    from numba import njit
+except ImportError:  # numba lags new Python releases; fall back to the pandas expressions
+    njit = None
 import re
+import io
 
 st.set_page_config(page_title="Business Analytics Case Studies Dashboard", layout="wide")
 
@@ -24,180 +32,409 @@ case_study = st.selectbox("Choose Case Study", [
     "5. Spotify User Listening Patterns"
 ])
 
+# Vectorized string builders (one numpy char op instead of a Python loop per row)
+def make_ids(prefix, n):
+    return np.char.add(prefix, np.char.zfill(np.arange(1, n+1).astype(str), 4))
+
+def make_times(rng, n):
+    h = rng.integers(0, 24, n, dtype=np.int32)
+    m = rng.integers(0, 60, n, dtype=np.int32)
+    return np.char.add(np.char.zfill(h.astype('U2'), 2), np.char.add(':', np.char.zfill(m.astype('U2'), 2)))
+
+# Fixed-vocabulary draws are stored as pd.Categorical (small integer codes instead of Python strings)
+def categorical_choice(rng, categories, n, p=None):
+    return pd.Categorical(rng.choice(categories, n, p=p), categories=categories)
+
 # Generate sample datasets (embedded)
 @st.cache_data
 def generate_sample_data(topic):
-    np.random.seed(42)
+    rng = np.random.default_rng(42)
     n = 1000
     if topic == "1. Instagram User Engagement":
-        post_ids = [f'POST-{i:04d}' for i in range(1, n+1)]
-        post_types = np.random.choice(['Photo', 'Video', 'Reel', 'Story', 'Carousel'], n, p=[0.3, 0.2, 0.3, 0.1, 0.1])
-        post_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(np.random.randint(0, 365, n), unit='D')
-        post_times = [f"{h:02d}:{m:02d}" for h, m in zip(np.random.randint(0, 24, n), np.random.randint(0, 60, n))]
-        likes = np.random.randint(50, 5000, n)
-        comments = np.random.randint(5, 500, n)
-        shares = np.random.randint(1, 1000, n)
-        reach = likes + comments + shares + np.random.randint(100, 10000, n)
+        post_ids = make_ids('POST-', n)
+        post_types = categorical_choice(rng, ['Photo', 'Video', 'Reel', 'Story', 'Carousel'], n, p=[0.3, 0.2, 0.3, 0.1, 0.1])
+        post_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(rng.integers(0, 365, n, dtype=np.int32), unit='D')
+        post_times = make_times(rng, n)
+        likes = rng.integers(50, 5000, n, dtype=np.int32)
+        comments = rng.integers(5, 500, n, dtype=np.int32)
+        shares = rng.integers(1, 1000, n, dtype=np.int32)
+        reach = likes + comments + shares + rng.integers(100, 10000, n, dtype=np.int32)
         engagement_rate = np.round((likes + comments + shares) / reach * 100, 2)
-        followers_growth = np.random.choice([-10, 0, 5, 10, 20, 50], n, p=[0.05, 0.2, 0.3, 0.2, 0.15, 0.1])
+        followers_growth = rng.choice([-10, 0, 5, 10, 20, 50], n, p=[0.05, 0.2, 0.3, 0.2, 0.15, 0.1]).astype(np.int32)
         df = pd.DataFrame({
             'post_id': post_ids, 'post_type': post_types, 'post_date': post_dates, 'post_time': post_times,
             'likes': likes, 'comments': comments, 'shares': shares, 'reach': reach,
             'engagement_rate': engagement_rate, 'followers_growth': followers_growth
         })
     elif topic == "2. McDonald's Store Sales":
-        order_ids = [f'ORDER-{i:04d}' for i in range(1, n+1)]
-        store_zones = np.random.choice(['North', 'South', 'East', 'West', 'Central'], n)
-        order_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(np.random.randint(0, 365, n), unit='D')
-        order_times = [f"{h:02d}:{m:02d}" for h, m in zip(np.random.randint(0, 24, n), np.random.randint(0, 60, n))]
-        menu_items = np.random.choice(['Burger', 'Fries', 'Beverage', 'Combo', 'Dessert', 'Salad'], n)
-        items_per_order = np.random.randint(1, 6, n)
-        order_value = np.round(np.random.uniform(100, 1000, n), 2)
+        order_ids = make_ids('ORDER-', n)
+        store_zones = categorical_choice(rng, ['North', 'South', 'East', 'West', 'Central'], n)
+        order_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(rng.integers(0, 365, n, dtype=np.int32), unit='D')
+        order_times = make_times(rng, n)
+        menu_items = categorical_choice(rng, ['Burger', 'Fries', 'Beverage', 'Combo', 'Dessert', 'Salad'], n)
+        items_per_order = rng.integers(1, 6, n, dtype=np.int32)
+        order_value = np.round(rng.uniform(100, 1000, n), 2)
         is_weekend = order_dates.dayofweek >= 5
-        repeat_customer = np.random.choice([0, 1], n, p=[0.6, 0.4])
+        repeat_customer = rng.choice([0, 1], n, p=[0.6, 0.4]).astype(np.int32)
         df = pd.DataFrame({
             'order_id': order_ids, 'store_zone': store_zones, 'order_date': order_dates, 'order_time': order_times,
             'menu_item': menu_items, 'items_per_order': items_per_order, 'order_value': order_value,
             'is_weekend': is_weekend, 'repeat_customer': repeat_customer
         })
     elif topic == "3. Netflix Content Performance":
-        content_ids = [f'CONTENT-{i:04d}' for i in range(1, n+1)]
-        genres = np.random.choice(['Drama', 'Comedy', 'Thriller', 'Documentary', 'Action', 'Sci-Fi'], n)
-        view_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(np.random.randint(0, 365, n), unit='D')
-        watch_time_min = np.random.randint(10, 120, n)
-        completion_rate = np.round(np.random.uniform(0.1, 1.0, n), 2)
-        drop_off_episode = np.random.choice([1,2,3,4,5,'None'], n)
-        user_rating = np.round(np.random.uniform(1.0, 5.0, n), 1)
-        is_original = np.random.choice([0, 1], n, p=[0.4, 0.6])
+        content_ids = make_ids('CONTENT-', n)
+        genres = categorical_choice(rng, ['Drama', 'Comedy', 'Thriller', 'Documentary', 'Action', 'Sci-Fi'], n)
+        view_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(rng.integers(0, 365, n, dtype=np.int32), unit='D')
+        watch_time_min = rng.integers(10, 120, n, dtype=np.int32)
+        completion_rate = np.round(rng.uniform(0.1, 1.0, n), 2)
+        drop_off_episode = rng.choice([1,2,3,4,5,'None'], n)
+        user_rating = np.round(rng.uniform(1.0, 5.0, n), 1)
+        is_original = rng.choice([0, 1], n, p=[0.4, 0.6]).astype(np.int32)
         df = pd.DataFrame({
             'content_id': content_ids, 'genre': genres, 'view_date': view_dates, 'watch_time_min': watch_time_min,
             'completion_rate': completion_rate, 'drop_off_episode': drop_off_episode,
             'user_rating': user_rating, 'is_original': is_original
         })
     elif topic == "4. Amazon Order Fulfillment":
-        order_ids = [f'AMZ-ORDER-{i:04d}' for i in range(1, n+1)]
-        categories = np.random.choice(['Electronics', 'Clothing', 'Books', 'Home', 'Beauty'], n)
-        order_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(np.random.randint(0, 365, n), unit='D')
-        delivery_days = np.random.randint(1, 7, n)
-        on_time = np.random.choice([0, 1], n, p=[0.2, 0.8])
-        returned = np.random.choice([0, 1], n, p=[0.85, 0.15])
-        customer_rating = np.round(np.random.uniform(1.0, 5.0, n), 1)
-        fulfillment_cost = np.round(np.random.uniform(50, 500, n), 2)
-        zone = np.random.choice(['Urban', 'Rural', 'Suburban'], n)
+        order_ids = make_ids('AMZ-ORDER-', n)
+        categories = categorical_choice(rng, ['Electronics', 'Clothing', 'Books', 'Home', 'Beauty'], n)
+        order_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(rng.integers(0, 365, n, dtype=np.int32), unit='D')
+        delivery_days = rng.integers(1, 7, n, dtype=np.int32)
+        on_time = rng.choice([0, 1], n, p=[0.2, 0.8]).astype(np.int32)
+        returned = rng.choice([0, 1], n, p=[0.85, 0.15]).astype(np.int32)
+        customer_rating = np.round(rng.uniform(1.0, 5.0, n), 1)
+        fulfillment_cost = np.round(rng.uniform(50, 500, n), 2)
+        zone = categorical_choice(rng, ['Urban', 'Rural', 'Suburban'], n)
         df = pd.DataFrame({
             'order_id': order_ids, 'category': categories, 'order_date': order_dates, 'delivery_days': delivery_days,
             'on_time': on_time, 'returned': returned, 'customer_rating': customer_rating,
             'fulfillment_cost': fulfillment_cost, 'zone': zone
         })
     elif topic == "5. Spotify User Listening Patterns":
-        user_ids = [f'USER-{i:04d}' for i in range(1, n+1)]
-        genres = np.random.choice(['Pop', 'Hip-Hop', 'Rock', 'Classical', 'Jazz', 'Electronic'], n)
-        listen_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(np.random.randint(0, 365, n), unit='D')
-        listen_time_min = np.random.randint(5, 60, n)
-        skips = np.random.randint(0, 10, n)
-        subscription = np.random.choice(['Free', 'Premium'], n, p=[0.6, 0.4])
-        device = np.random.choice(['Mobile', 'Desktop', 'Tablet'], n)
-        churn = np.random.choice([0, 1], n, p=[0.85, 0.15])
+        user_ids = make_ids('USER-', n)
+        genres = categorical_choice(rng, ['Pop', 'Hip-Hop', 'Rock', 'Classical', 'Jazz', 'Electronic'], n)
+        listen_dates = pd.date_range('2024-01-01', periods=n) + pd.to_timedelta(rng.integers(0, 365, n, dtype=np.int32), unit='D')
+        listen_time_min = rng.integers(5, 60, n, dtype=np.int32)
+        skips = rng.integers(0, 10, n, dtype=np.int32)
+        subscription = categorical_choice(rng, ['Free', 'Premium'], n, p=[0.6, 0.4])
+        device = categorical_choice(rng, ['Mobile', 'Desktop', 'Tablet'], n)
+        churn = rng.choice([0, 1], n, p=[0.85, 0.15]).astype(np.int32)
         df = pd.DataFrame({
             'user_id': user_ids, 'genre': genres, 'listen_date': listen_dates, 'listen_time_min': listen_time_min,
             'skips': skips, 'subscription': subscription, 'device': device, 'churn': churn
         })
     return df
 
+# ─── Cached pipeline stages ──────────────────────────────────────────────
+# Each stage is memoized separately so a rerun only recomputes what changed.
+# Stages are keyed on the data source (sample topic or upload) instead of the frame:
+# hashing a large DataFrame on every rerun costs more than most stages save.
+# The frame is passed as `_df`, which Streamlit leaves out of the cache key.
+# Every stage keyed by the data source is bounded: the cache is global across sessions,
+# so unbounded entries would keep results (frames, CSVs, figures) for every upload forever.
+FRAME_CACHE_ENTRIES = 5  # one per case study for the current data source
+FRAME_CACHE_TTL = 3600  # seconds
+
+# load_csv is keyed on an xxh3 digest of the upload (the bytes themselves go in unhashed as `_bytes`),
+# which is far cheaper than Streamlit's default md5 over the raw bytes
+def fast_hash(b):
+    return xxhash.xxh3_64_intdigest(b)
+
+# Parsed with pyarrow's multithreaded reader. Columns it would turn into datetime.time
+# (e.g. HH:MM) are kept as text, as the C engine reads them. Files it rejects (ragged rows)
+# and header-only files (pyarrow gives float columns) go through the C engine instead.
+@st.cache_data(show_spinner=False, max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def load_csv(digest, _bytes):
+    try:
+        schema = pa_csv.open_csv(io.BytesIO(_bytes)).schema  # inferred from the first block only
+        as_text = {field.name: pa.string() for field in schema if pa.types.is_time(field.type)}
+        convert = pa_csv.ConvertOptions(column_types=as_text)
+        df = pa_csv.read_csv(io.BytesIO(_bytes), convert_options=convert).to_pandas()
+    except pa.ArrowInvalid:
+        df = None
+    if df is None or len(df) == 0:
+        df = pd.read_csv(io.BytesIO(_bytes))
+    return df
+
+# int64 -> int32 to cut memory traffic downstream, only for columns within a quarter of
+# the int32 range so sums of a few columns (likes + comments + shares) cannot wrap around.
+# Floats stay float64: decimal data almost never survives float32 exactly.
+def downcast(df):
+    limit = np.iinfo(np.int32).max // 4
+    int_cols = [col for col in df.select_dtypes(include=['int64']).columns
+                if len(df) == 0 or (df[col].min() >= -limit and df[col].max() <= limit)]
+    return df.astype({col: np.int32 for col in int_cols})
+
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def clean(source, _df):
+    # _df comes from load_csv/generate_sample_data, whose st.cache_data results are
+    # fresh copies on every call, so the fills below can write to it in place.
+    df = _df
+    if source[0] == 'upload':  # Drop empty rows; generated samples never have any
+        keep = ~df.isna().to_numpy().all(axis=1)
+        if not keep.all():
+            df = df.iloc[keep].reset_index(drop=True)
+    # Fill numeric missing with median; columns without NaNs are left untouched
+    for col in df.select_dtypes(include=[np.number]).columns:
+        values = df[col].to_numpy()
+        missing = np.isnan(values)
+        if missing.any():
+            df[col] = np.where(missing, np.nanmedian(values), values)
+    # Fill categorical missing
+    for col in df.select_dtypes(include=['object']).columns:
+        if df[col].isna().any():
+            df[col] = df[col].fillna('Unknown')
+        # Low-cardinality text -> category. Date columns are left alone (to_datetime on a
+        # categorical returns a categorical), as are non-text objects such as datetime.date.
+        if (len(df) and 'date' not in col.lower() and pd.api.types.infer_dtype(df[col], skipna=True) == 'string'
+                and df[col].nunique() / len(df) < 0.05):
+            df[col] = df[col].astype('category')
+    return downcast(df)
+
+# New columns are collected in a dict and attached with one concat per stage;
+# inserting them one at a time fragments the frame's blocks. Names that already
+# exist are assigned in place, so they keep their position as plain assignment would.
+def add_columns(df, new_cols):
+    fresh = {col: values for col, values in new_cols.items() if col not in df.columns}
+    for col in new_cols.keys() - fresh.keys():
+        df[col] = new_cols[col]
+    if not fresh:
+        return df
+    return pd.concat([df, pd.DataFrame(fresh, index=df.index)], axis=1)
+
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def transform(source, _df, date_col):
+    df = _df.copy()
+    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    new_cols = {}
+    if date_col is not None:
+        if df[date_col].dtype.kind != 'M':  # Generated data is already datetime64; uploads arrive as datetime.date objects or text
+            df[date_col] = pd.to_datetime(df[date_col], format='ISO8601', cache=True, errors='coerce')
+        new_cols['day_of_week'] = df[date_col].dt.day_name()
+        new_cols['is_weekend'] = df[date_col].dt.weekday >= 5
+
+    # Normalize numeric columns (min-max) in one pass; constant columns are skipped
+    if len(df) and len(numeric_cols):
+        num = df[numeric_cols].to_numpy(dtype=np.float32)
+        mn = np.nanmin(num, axis=0)
+        mx = np.nanmax(num, axis=0)
+        keep = mx > mn
+        norm = (num[:, keep] - mn[keep]) / (mx[keep] - mn[keep])
+        for col, values in zip(numeric_cols[keep], norm.T):
+            new_cols[f'{col}_normalized'] = values
+    return add_columns(df, new_cols)
+
+# Fused single-pass kernels for the per-row feature arithmetic on large uploads.
+# error_model='numpy' keeps pandas' division semantics (x/0 -> inf, 0/0 -> nan).
+# Serial on purpose: numba's parallel workqueue layer aborts the process when two
+# Streamlit sessions enter a parallel kernel at once.
+NUMBA_MIN_ROWS = 100_000
+
+# Built once per process (module code reruns on every interaction), so each kernel is
+# compiled once and reused instead of being redefined and recompiled on every rerun.
+@st.cache_resource
+def numba_kernels():
+    @njit(error_model='numpy')
+    def ratio_kernel(num, den, out):
+        for i in range(num.shape[0]):
+            out[i] = num[i] / den[i]
+
+    @njit(error_model='numpy')
+    def satisfaction_kernel(on_time, rating, returned, out):
+        for i in range(on_time.shape[0]):
+            out[i] = on_time[i] * rating[i] - returned[i]
+
+    return ratio_kernel, satisfaction_kernel
+
+def use_numba(df):
+    return njit is not None and len(df) >= NUMBA_MIN_ROWS
+
+def ratio(df, num, den):
+    if not use_numba(df):
+        return df[num] / df[den]
+    ratio_kernel, _ = numba_kernels()
+    out = np.empty(len(df))
+    ratio_kernel(df[num].to_numpy(), df[den].to_numpy(), out)
+    return out
+
+def satisfaction_score(df):
+    if not use_numba(df):
+        return df['on_time'] * df['customer_rating'] - df['returned']
+    _, satisfaction_kernel = numba_kernels()
+    out = np.empty(len(df))
+    satisfaction_kernel(df['on_time'].to_numpy(), df['customer_rating'].to_numpy(), df['returned'].to_numpy(), out)
+    return out
+
+# Topic-specific features: each returns a dict of new columns for add_columns()
+FEATURES = {
+    "1. Instagram User Engagement": lambda df: {'engagement_rate': (df['likes'] + df['comments'] + df['shares']) / df['reach']},
+    "2. McDonald's Store Sales": lambda df: {'avg_item_value': ratio(df, 'order_value', 'items_per_order')},
+    "3. Netflix Content Performance": lambda df: {'retention_category': pd.Categorical.from_codes((df['completion_rate'].to_numpy() > 0.8).astype(np.int8), categories=['Low', 'High'])},
+    "4. Amazon Order Fulfillment": lambda df: {'satisfaction_score': satisfaction_score(df)},
+    "5. Spotify User Listening Patterns": lambda df: {'skip_rate': ratio(df, 'skips', 'listen_time_min')},
+}
+
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def engineer(source, _df, case_study):
+    features = FEATURES.get(case_study)
+    return add_columns(_df, features(_df) if features else {})
+
+ID_NUMBER_PATTERN = re.compile(r'(\d+)')
+
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def extract_id_numbers(source, _df, case_study, id_col):
+    extracted = _df[id_col].str.extract(ID_NUMBER_PATTERN, expand=False)
+    return add_columns(_df, {'extracted_number': extracted})
+
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def weekend_ttest(source, _df, case_study):
+    values = _df['order_value'].to_numpy()
+    weekend = _df['is_weekend'].to_numpy(dtype=bool)
+    t_stat, p_val = stats.ttest_ind(values[weekend], values[~weekend], equal_var=False)
+    return t_stat, p_val
+
+# Group aggregates feeding the charts; they are memoized through make_figure,
+# which caches the finished figure per data source and topic.
+def agg_mean(df, by, col):
+    return df.groupby(by, observed=True)[col].mean().reset_index()
+
+def box_stats(df, by, col):
+    groups = df.groupby(by, observed=True)[col]
+    quartiles = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    q1, q3 = quartiles[0.25], quartiles[0.75]
+    # Tukey whiskers: most extreme values within 1.5 IQR of the box, as Plotly computes them
+    row_q1, row_q3 = groups.transform('quantile', 0.25), groups.transform('quantile', 0.75)
+    inside = df[col].between(row_q1 - 1.5 * (row_q3 - row_q1), row_q3 + 1.5 * (row_q3 - row_q1))
+    fences = df.loc[inside].groupby(by, observed=True)[col].agg(['min', 'max']).reindex(quartiles.index)
+    return pd.DataFrame({
+        'q1': q1, 'median': quartiles[0.5], 'q3': q3,
+        'lowerfence': fences['min'], 'upperfence': fences['max'],
+    }).reset_index()
+
+# Figures are built from graph_objects traces directly, skipping plotly.express's
+# DataFrame-to-trace conversion, which dominates build time on large uploads.
+def bar_of_means(df, x, y):
+    means = agg_mean(df, x, y)
+    fig = go.Figure(go.Bar(x=means[x].to_numpy(), y=means[y].to_numpy()))
+    return fig.update_layout(xaxis_title=x, yaxis_title=y)
+
+# Above this many rows box plots are summarized server-side: only the per-group
+# quartiles and whisker ends go to the browser instead of every raw value.
+BOX_AGGREGATE_ROWS = 5000
+
+def box_plot(df, x, y):
+    if len(df) <= BOX_AGGREGATE_ROWS:
+        fig = go.Figure(go.Box(x=df[x].to_numpy(), y=df[y].to_numpy()))
+        return fig.update_layout(xaxis_title=x, yaxis_title=y)
+    summary = box_stats(df, x, y)
+    fig = go.Figure(go.Box(
+        x=summary[x].to_numpy(), q1=summary['q1'].to_numpy(), median=summary['median'].to_numpy(),
+        q3=summary['q3'].to_numpy(), lowerfence=summary['lowerfence'].to_numpy(),
+        upperfence=summary['upperfence'].to_numpy(),
+    ))
+    return fig.update_layout(xaxis_title=x, yaxis_title=y)
+
+# Topic-specific visuals
+PLOTS = {
+    "1. Instagram User Engagement": lambda df: bar_of_means(df, 'post_type', 'engagement_rate'),
+    "2. McDonald's Store Sales": lambda df: box_plot(df, 'store_zone', 'order_value'),
+    "3. Netflix Content Performance": lambda df: bar_of_means(df, 'genre', 'watch_time_min'),
+    "4. Amazon Order Fulfillment": lambda df: box_plot(df, 'zone', 'delivery_days'),
+    "5. Spotify User Listening Patterns": lambda df: bar_of_means(df, 'genre', 'listen_time_min'),
+}
+
+# Returns fig.to_dict() to keep the cached payload small; rebuild with go.Figure(d)
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def make_figure(source, _df, case_study):
+    plot = PLOTS.get(case_study)
+    if plot is None:
+        return None
+    return plot(_df).to_dict()
+
+# Cached so reruns (e.g. clicking the download button) do not re-serialize the frame
+@st.cache_data(max_entries=FRAME_CACHE_ENTRIES, ttl=FRAME_CACHE_TTL)
+def to_csv_bytes(source, _df, case_study):
+    return _df.to_csv(index=False).encode()
+
+DATE_COLUMNS = {'date', 'post_date', 'order_date', 'view_date', 'listen_date'}
+
+INSIGHTS = {
+    "1. Instagram User Engagement": "Q: Best content? A: Reels/Video highest engagement",
+    "2. McDonald's Store Sales": "Q: Best zone? A: Central/North highest avg sales",
+    "3. Netflix Content Performance": "Q: Best genre? A: Thriller/Action highest watch time",
+    "4. Amazon Order Fulfillment": "Q: Worst zone? A: Rural highest delay – add resources",
+    "5. Spotify User Listening Patterns": "Q: Popular genre? A: Pop/Hip-Hop highest listening",
+}
+
 # Upload or use sample
 uploaded_file = st.file_uploader("Upload your CSV (optional)", type="csv")
+
+# Nothing heavy runs until the user asks for it; after that, changing the case study
+# or upload reruns the (cached) pipeline directly.
+if st.button("Run analysis"):
+    st.session_state['analysis_started'] = True
+if not st.session_state.get('analysis_started'):
+    st.info("Choose a case study, optionally upload a CSV, then click Run analysis.")
+    st.stop()
+
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    source = ('upload', uploaded_file.file_id)
+    data = uploaded_file.getvalue()
+    df = load_csv(fast_hash(data), data)
 else:
+    source = ('sample', case_study)
     df = generate_sample_data(case_study)
     st.info("Using generated sample data (1000 rows).")
 
-# ─── Data Cleaning ──────────────────────────────────────────────────────
-st.subheader("Data Cleaning")
-df = df.dropna(how='all')  # Drop empty rows
-numeric_cols = df.select_dtypes(include=[np.number]).columns
-df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())  # Fill numeric missing with median
-categorical_cols = df.select_dtypes(include=['object']).columns
-df[categorical_cols] = df[categorical_cols].fillna('Unknown')  # Fill categorical missing
-st.write(f"Rows after cleaning: {len(df)}")
-
-# ─── Transformation & Normalization ──────────────────────────────────────
-st.subheader("Transformation & Normalization")
-if 'date' in df.columns or 'post_date' in df.columns or 'order_date' in df.columns or 'view_date' in df.columns or 'listen_date' in df.columns:
-    date_col = next(col for col in df.columns if 'date' in col.lower())
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df['day_of_week'] = df[date_col].dt.day_name()
-    df['is_weekend'] = df[date_col].dt.weekday >= 5
-
-# Normalize numeric columns (min-max)
-for col in numeric_cols:
-    if df[col].max() - df[col].min() > 0:
-        df[f'{col}_normalized'] = (df[col] - df[col].min()) / (df[col].max() - df[col].min())
-
-st.write("Added: day_of_week, is_weekend, normalized columns")
-
-# ─── Feature Engineering ─────────────────────────────────────────────────
-st.subheader("Feature Engineering")
-# Topic-specific features
-if case_study == "1. Instagram User Engagement":
-    df['engagement_rate'] = (df['likes'] + df['comments'] + df['shares']) / df['reach']
-elif case_study == "2. McDonald's Store Sales":
-    df['avg_item_value'] = df['order_value'] / df['items_per_order']
-elif case_study == "3. Netflix Content Performance":
-    df['retention_category'] = np.where(df['completion_rate'] > 0.8, 'High', 'Low')
-elif case_study == "4. Amazon Order Fulfillment":
-    df['satisfaction_score'] = df['on_time'] * df['customer_rating'] - df['returned']
-elif case_study == "5. Spotify User Listening Patterns":
-    df['skip_rate'] = df['skips'] / df['listen_time_min']
-
-st.write("Added topic-specific features (e.g., rates, categories)")
-
-# ─── Regex Example ───────────────────────────────────────────────────────
-st.subheader("Regex Example (Extract from IDs)")
-id_col = next((col for col in df.columns if 'id' in col.lower()), None)
-if id_col:
-    df['extracted_number'] = df[id_col].str.extract(r'(\d+)', expand=False)
-    st.write("Extracted numbers from IDs (sample):")
-    st.dataframe(df[[id_col, 'extracted_number']].head())
-
-# ─── Hypothesis Testing ──────────────────────────────────────────────────
-st.subheader("Hypothesis Testing Example")
-if 'is_weekend' in df.columns and 'order_value' in df.columns:  # Adapt based on topic
-    weekend = df[df['is_weekend']]['order_value']
-    weekday = df[~df['is_weekend']]['order_value']
-    t_stat, p_val = stats.ttest_ind(weekend, weekday, equal_var=False)
-    st.write(f"t-test (Weekend vs Weekday Value): p-value = {p_val:.4f}")
-    if p_val < 0.05:
-        st.success("Significant difference (p < 0.05)")
-    else:
-        st.info("No significant difference")
-
-# ─── Visualizations & Business Questions ─────────────────────────────────
-st.subheader("Visualizations & Business Insights")
-# Topic-specific visuals/questions
-if case_study == "1. Instagram User Engagement":
-    fig = px.bar(df.groupby('post_type')['engagement_rate'].mean().reset_index(), x='post_type', y='engagement_rate')
-    st.plotly_chart(fig)
-    st.write("Q: Best content? A: Reels/Video highest engagement")
-elif case_study == "2. McDonald's Store Sales":
-    fig = px.box(df, x='store_zone', y='order_value')
-    st.plotly_chart(fig)
-    st.write("Q: Best zone? A: Central/North highest avg sales")
-elif case_study == "3. Netflix Content Performance":
-    fig = px.bar(df.groupby('genre')['watch_time_min'].mean().reset_index(), x='genre', y='watch_time_min')
-    st.plotly_chart(fig)
-    st.write("Q: Best genre? A: Thriller/Action highest watch time")
-elif case_study == "4. Amazon Order Fulfillment":
-    fig = px.box(df, x='zone', y='delivery_days')
-    st.plotly_chart(fig)
-    st.write("Q: Worst zone? A: Rural highest delay – add resources")
-elif case_study == "5. Spotify User Listening Patterns":
-    fig = px.bar(df.groupby('genre')['listen_time_min'].mean().reset_index(), x='genre', y='listen_time_min')
-    st.plotly_chart(fig)
-    st.write("Q: Popular genre? A: Pop/Hip-Hop highest listening")
-
-st.markdown("**Note**: Adapt business questions in code for full analysis. Download below.")
-
-# Download
-csv = df.to_csv(index=False)
-st.download_button("Download Processed CSV", csv, "processed_data.csv", "text/csv")
\ No newline at end of file
+# Runs as a fragment so its own widgets (e.g. the download button) rerun only this section
+@st.fragment
+def analysis_section(source, df, case_study):
+    # ─── Data Cleaning ──────────────────────────────────────────────────────
+    st.subheader("Data Cleaning")
+    df = clean(source, df)
+    st.write(f"Rows after cleaning: {len(df)}")
+
+    # ─── Transformation & Normalization ──────────────────────────────────────
+    st.subheader("Transformation & Normalization")
+    date_col = next((col for col in df.columns if col in DATE_COLUMNS), None)
+    df = transform(source, df, date_col)
+    st.write("Added: day_of_week, is_weekend, normalized columns")
+
+    # ─── Feature Engineering ─────────────────────────────────────────────────
+    st.subheader("Feature Engineering")
+    df = engineer(source, df, case_study)
+    st.write("Added topic-specific features (e.g., rates, categories)")
+
+    # ─── Regex Example ───────────────────────────────────────────────────────
+    st.subheader("Regex Example (Extract from IDs)")
+    id_col = next((col for col in df.columns if 'id' in col.lower()), None)
+    if id_col:
+        df = extract_id_numbers(source, df, case_study, id_col)
+        st.write("Extracted numbers from IDs (sample):")
+        st.dataframe(df[[id_col, 'extracted_number']].head())
+
+    # ─── Hypothesis Testing ──────────────────────────────────────────────────
+    st.subheader("Hypothesis Testing Example")
+    if 'is_weekend' in df.columns and 'order_value' in df.columns:  # Adapt based on topic
+        t_stat, p_val = weekend_ttest(source, df, case_study)
+        st.write(f"t-test (Weekend vs Weekday Value): p-value = {p_val:.4f}")
+        if p_val < 0.05:
+            st.success("Significant difference (p < 0.05)")
+        else:
+            st.info("No significant difference")
+
+    # ─── Visualizations & Business Questions ─────────────────────────────────
+    st.subheader("Visualizations & Business Insights")
+    # Topic-specific visuals/questions
+    fig_dict = make_figure(source, df, case_study)
+    if fig_dict is not None:
+        st.plotly_chart(go.Figure(fig_dict))
+        st.write(INSIGHTS[case_study])
+
+    st.markdown("**Note**: Adapt business questions in code for full analysis. Download below.")
+
+    # Download
+    csv = to_csv_bytes(source, df, case_study)
+    st.download_button("Download Processed CSV", csv, "processed_data.csv", "text/csv")
+
+analysis_section(source, df, case_study)